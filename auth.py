@@ -0,0 +1,31 @@
+import os
+import sys
+import yaml
+import bcrypt
+import streamlit as st
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Hashes are generated offline with `python auth.py <password>` and stored in this file
+CREDENTIALS_FILE = os.getenv("CREDENTIALS_FILE", "credentials.yaml")
+
+@st.cache_resource
+def load_credentials():
+    # Read once per process; reruns of the login page reuse the same lists
+    with open(CREDENTIALS_FILE) as f:
+        config = yaml.safe_load(f)
+
+    names, usernames, hashed_passwords = [], [], []
+    for username, user in config["usernames"].items():
+        usernames.append(username)
+        names.append(user["name"])
+        hashed_passwords.append(user["password"])
+    return names, usernames, hashed_passwords
+
+def hash_password(password: str):
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+if __name__ == "__main__":
+    for password in sys.argv[1:]:
+        print(hash_password(password))
@@ -0,0 +1,119 @@
+import os
+import sys
+import csv
+import argparse
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils import connect_to_db, all_clinicians_query, clinician_shifts_query, month_consultations_query
+
+# Month-level report queries that can be exported, keyed by report name
+EXPORT_QUERIES = {
+    "clinicians": all_clinicians_query,
+    "shifts": clinician_shifts_query,
+    "consultations": month_consultations_query,
+}
+
+BATCH_SIZE = 5000
+
+# Postgres type OIDs (cursor.description type_code) to Arrow types; anything else is written as text.
+# NUMERIC (1700), which includes money columns such as shift_cost, is written to Parquet as float64
+# because the report columns have no declared scale; CSV keeps the exact decimal text.
+PG_ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int64(),
+    23: pa.int64(),
+    700: pa.float64(),
+    701: pa.float64(),
+    1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+
+def stream_report(report: str, months, batch_size=BATCH_SIZE):
+    # Rows come from a named (server-side) cursor, so only one batch is held in memory at a time.
+    # A named cursor only has a description after its first FETCH, so that batch is always
+    # yielded, even when empty, and writers can take their header/schema from it.
+    conn = connect_to_db().raw_connection()
+    try:
+        for month in months:
+            cursor = conn.cursor(name=f"export_{report}")
+            # DECLARE ... CURSOR FOR does not accept a trailing semicolon
+            cursor.execute(EXPORT_QUERIES[report](month).strip().rstrip(";"))
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                yield cursor.description, rows
+                if len(rows) < batch_size:
+                    break
+            cursor.close()
+    finally:
+        conn.close()
+
+def write_csv(batches, path, progress=None):
+    rows_written = 0
+    header_written = False
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        for description, rows in batches:
+            if not header_written:
+                writer.writerow([col.name for col in description])
+                header_written = True
+            writer.writerows(rows)
+            rows_written += len(rows)
+            if progress:
+                progress(rows_written)
+    return rows_written
+
+def arrow_column(values, arrow_type):
+    if pa.types.is_floating(arrow_type):
+        # numeric columns arrive as Decimal
+        return pa.array([None if v is None else float(v) for v in values], type=arrow_type)
+    if pa.types.is_string(arrow_type):
+        return pa.array([None if v is None else str(v) for v in values], type=arrow_type)
+    return pa.array(values, type=arrow_type)
+
+def write_parquet(batches, path, progress=None):
+    rows_written = 0
+    writer = None
+    try:
+        for description, rows in batches:
+            if writer is None:
+                schema = pa.schema([(col.name, PG_ARROW_TYPES.get(col.type_code, pa.string())) for col in description])
+                writer = pq.ParquetWriter(path, schema)
+            if not rows:
+                continue
+            columns = [arrow_column(values, field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            rows_written += len(rows)
+            if progress:
+                progress(rows_written)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+def export_report(report: str, months, path, progress=None):
+    if report not in EXPORT_QUERIES:
+        raise ValueError(f"Unknown report '{report}', expected one of {', '.join(EXPORT_QUERIES)}")
+    if not months:
+        raise ValueError("At least one month is required")
+    if "(All)" in months:
+        # month_start maps "(All)" to the dashboard's default month, which would mislabel the file
+        raise ValueError("Exports are per month; pass each month explicitly instead of '(All)'")
+    batches = stream_report(report, months)
+    if os.path.splitext(path)[1].lower() == ".parquet":
+        return write_parquet(batches, path, progress)
+    return write_csv(batches, path, progress)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export month-level report data to CSV or Parquet. "
+                                                 "NUMERIC columns are written to Parquet as float64.")
+    parser.add_argument("report", choices=EXPORT_QUERIES)
+    parser.add_argument("months", nargs="+", help='Months to export, e.g. "October 2024"')
+    parser.add_argument("-o", "--output", required=True, help="Output file, .csv or .parquet")
+    args = parser.parse_args()
+
+    total = export_report(args.report, args.months, args.output,
+                          progress=lambda rows: print(f"\r{rows} rows written", end="", file=sys.stderr))
+    print(f"\nExported {total} rows to {args.output}", file=sys.stderr)
@@ -10,6 +10,7 @@ import streamlit_authenticator as stauth
 from utils import load_data, ensure_duration_format, load_hourly_data
 from streamlit_extras.mandatory_date_range import date_range_picker
 from navigation import make_sidebar
+from auth import load_credentials
 from time import sleep
 
 make_sidebar()
@@ -19,10 +20,11 @@ load_dotenv()
 #         st.session_state.selected_row_index = None
 #         st.session_state.next_btn = False
 
-names = ["Admin User"]
-usernames = ["admin"]
-passwords = ["He4lth!"]
-hashed_passwords = stauth.Hasher(passwords).generate()
+if st.session_state.get("logged_in", False):
+    # Cookie/session was verified on an earlier rerun, skip the authenticator entirely
+    st.switch_page("pages/Activity Report.py")
+
+names, usernames, hashed_passwords = load_credentials()
 
 authenticator = stauth.Authenticate(
     names=names,
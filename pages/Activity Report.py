@@ -19,7 +19,7 @@ def plot_daily_hours_cost(data, start_date, end_date):
 
     filtered_data = data.query("@start_date <= date <= @end_date")
 
-    grouped_data = filtered_data.groupby(['date', 'role'], as_index=False).agg(
+    grouped_data = filtered_data.groupby(['date', 'role'], as_index=False, observed=True).agg(
         total_hours=('duration_hours', 'sum'),
         total_cost=('value', 'sum')
     )
@@ -1,10 +1,13 @@
 import streamlit as st
-from utils import load_clinician_data, load_shift_data, load_case_data, load_all_clinicans_data, load_data, load_hourly_data
+from utils import load_clinician_data, load_shift_data, load_case_data, load_all_clinicans_data, load_data, load_hourly_data, frame_memory_report
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from navigation import make_sidebar
+from export import EXPORT_QUERIES, export_report
+import tempfile
+import os
 
 make_sidebar()
 st.header("Performance - All Clinicians")
@@ -31,8 +34,36 @@ selected_month_year = st.sidebar.selectbox('Select Month-Year', month_years, ind
 if selected_month_year != "(All)":
     role_df = role_df[role_df['month_year'] == selected_month_year]
 
+with st.sidebar.expander("Export"):
+    export_name = st.selectbox("Report", list(EXPORT_QUERIES))
+    export_format = st.selectbox("Format", ["csv", "parquet"])
+    # The download button holds the finished file in memory, so the UI exports one month at a time
+    st.caption("Exports the selected month only. For several months or a full year run "
+               "`python export.py <report> <month> ... -o <file>` on the server.")
+    if selected_month_year == "(All)":
+        st.caption("Select a single month to export.")
+    if st.button("Prepare Export", disabled=selected_month_year == "(All)"):
+        # Rows are streamed to disk in batches rather than built up as a DataFrame
+        export_fd, export_path = tempfile.mkstemp(suffix=f".{export_format}")
+        os.close(export_fd)
+        try:
+            export_status = st.empty()
+            rows_exported = export_report(export_name, [selected_month_year], export_path,
+                                          progress=lambda rows: export_status.text(f"{rows} rows written"))
+            export_status.text(f"{rows_exported} rows exported")
+            with open(export_path, "rb") as f:
+                st.download_button("Download", f, file_name=f"{export_name}_{selected_month_year}.{export_format}")
+        finally:
+            # Exports can hold raw consultation text, so never leave a partial file behind
+            os.remove(export_path)
+
 
 df = load_all_clinicans_data(selected_month_year)
+
+with st.sidebar.expander("Cache Memory"):
+    # Memory held by each loader's frame before and after dtype compaction
+    st.dataframe(frame_memory_report(), hide_index=True)
+
 df.insert(0, 'Select', [False for _ in range(df.shape[0])])
 edited_df = st.data_editor(df.drop("personid", axis=1).style.format(thousands=''), num_rows= "fixed", disabled=df.columns.drop('Select'), hide_index=True)
 # Filter to find selected rows based on the 'Select' column
@@ -0,0 +1,84 @@
+-- Consultation-type dimension, stored category codes and stored duration used by the report loaders in utils.py.
+-- Deploy step: run once against DATABASE_URL before starting a release that needs it, e.g.
+--     psql "$DATABASE_URL" -f sql/consultation_categories.sql
+-- Safe to re-run. The first run rewrites consultations twice: once to add the stored duration, once to fill the category codes.
+-- Report queries resolve codes from this table by category_name, so a recode shows up once the loaders' 1-hour caches expire.
+-- utils.check_report_schema stops the dashboard with an error naming this file if it has not been applied.
+
+CREATE TABLE IF NOT EXISTS consultation_categories (
+    cons_type text PRIMARY KEY,
+    category_code smallint NOT NULL,
+    category_name text NOT NULL
+);
+
+-- Consultation length in seconds, computed once on write instead of per row in every query
+ALTER TABLE consultations
+    ADD COLUMN IF NOT EXISTS cons_duration_secs numeric
+    GENERATED ALWAYS AS (EXTRACT(EPOCH FROM ("Cons_End_Time" - "Cons_Begin_Time"))) STORED;
+
+-- Category codes of "Cons_Type" and "Next_Cons_Type", NULL for types the reports ignore
+ALTER TABLE consultations
+    ADD COLUMN IF NOT EXISTS category_code smallint,
+    ADD COLUMN IF NOT EXISTS next_category_code smallint;
+
+-- The loaders read these codes by category_name, so this is the only place they are defined
+INSERT INTO consultation_categories (cons_type, category_code, category_name) VALUES
+    ('GP Advice', 1, 'Advice'),
+    ('Advice', 1, 'Advice'),
+    ('Treatment Centre', 2, 'Treatment Centre'),
+    ('CAS Treatment Centre - BARDOC', 2, 'Treatment Centre'),
+    ('Visit', 3, 'Visit'),
+    ('HMR VH Visit', 3, 'Visit'),
+    ('NWAS Triage', 4, 'NWAS Triage')
+ON CONFLICT (cons_type) DO UPDATE
+    SET category_code = EXCLUDED.category_code,
+        category_name = EXCLUDED.category_name
+    WHERE (consultation_categories.category_code, consultation_categories.category_name)
+        IS DISTINCT FROM (EXCLUDED.category_code, EXCLUDED.category_name);
+
+-- Fill the codes for existing rows in one pass; on a re-run only rows whose codes changed are touched
+UPDATE consultations c
+SET category_code = (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Cons_Type"),
+    next_category_code = (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Next_Cons_Type")
+WHERE (c.category_code, c.next_category_code) IS DISTINCT FROM (
+    (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Cons_Type"),
+    (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Next_Cons_Type"));
+
+-- Report loaders join consultations to rotas on rslid and keep only categorised rows
+CREATE INDEX IF NOT EXISTS consultations_rslid_category_idx
+    ON consultations (rslid, category_code);
+
+-- Triggers are created last so the seed and backfill above touch each consultation only once.
+-- Keep the codes in sync when consultations are written...
+CREATE OR REPLACE FUNCTION set_consultation_category_codes() RETURNS trigger AS $$
+BEGIN
+    SELECT category_code INTO NEW.category_code
+    FROM consultation_categories WHERE cons_type = NEW."Cons_Type";
+    SELECT category_code INTO NEW.next_category_code
+    FROM consultation_categories WHERE cons_type = NEW."Next_Cons_Type";
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS consultations_category_codes ON consultations;
+CREATE TRIGGER consultations_category_codes
+    BEFORE INSERT OR UPDATE OF "Cons_Type", "Next_Cons_Type" ON consultations
+    FOR EACH ROW EXECUTE FUNCTION set_consultation_category_codes();
+
+-- ...and when a type is added, recoded or removed in the lookup
+CREATE OR REPLACE FUNCTION sync_consultation_category_codes() RETURNS trigger AS $$
+BEGIN
+    UPDATE consultations c
+    SET category_code = (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Cons_Type")
+    WHERE c."Cons_Type" IN (OLD.cons_type, NEW.cons_type);
+    UPDATE consultations c
+    SET next_category_code = (SELECT cc.category_code FROM consultation_categories cc WHERE cc.cons_type = c."Next_Cons_Type")
+    WHERE c."Next_Cons_Type" IN (OLD.cons_type, NEW.cons_type);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS consultation_categories_sync ON consultation_categories;
+CREATE TRIGGER consultation_categories_sync
+    AFTER INSERT OR UPDATE OR DELETE ON consultation_categories
+    FOR EACH ROW EXECUTE FUNCTION sync_consultation_category_codes();
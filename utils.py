@@ -1,4 +1,5 @@
 import os
+import logging
 import pandas as pd
 import streamlit as st
 from sqlalchemy import create_engine
@@ -7,14 +8,82 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Schema the report loaders need from sql/consultation_categories.sql
+CONSULTATION_SCHEMA_FILE = "sql/consultation_categories.sql"
+CONSULTATION_COLUMNS = ("cons_duration_secs", "category_code", "next_category_code")
+REPORT_CATEGORIES = ("Advice", "Treatment Centre", "Visit", "NWAS Triage")
+
+# Bytes held by each loader's frame before and after compact_frame, for sizing caches
+frame_memory_usage = {}
+
 def connect_to_db():
     db_url = os.getenv("DATABASE_URL")
     engine = create_engine(db_url)
     return engine
 
+def compact_frame(df, loader: str, categories=(), strings=()):
+    # Low-cardinality columns become dictionary-encoded categoricals, free text
+    # moves to Arrow-backed strings and integers are downcast. Floats stay
+    # float64 so rounded report figures are unchanged.
+    before = df.memory_usage(deep=True).sum()
+    for column in categories:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    for column in strings:
+        if column in df.columns:
+            df[column] = df[column].astype("string[pyarrow]")
+    for column in df.select_dtypes(include="integer").columns:
+        df[column] = pd.to_numeric(df[column], downcast="integer")
+    after = df.memory_usage(deep=True).sum()
+    frame_memory_usage[loader] = (before, after)
+    logger.info("%s: %.1f KiB -> %.1f KiB", loader, before / 1024, after / 1024)
+    return df
+
+def frame_memory_report():
+    return pd.DataFrame(
+        [(loader, before / 1024, after / 1024) for loader, (before, after) in frame_memory_usage.items()],
+        columns=["loader", "before_kib", "after_kib"],
+    ).round(1)
+
+def drop_unused_categories(df):
+    # Slices of a compacted frame keep every category, which would show up as zero counts
+    for column in df.select_dtypes(include="category").columns:
+        df[column] = df[column].cat.remove_unused_categories()
+    return df
+
+@st.cache_resource
+def check_report_schema():
+    # Fail with a pointer to the migration instead of an "undefined column" error deep in a report
+    conn = connect_to_db()
+    columns_query = f"""SELECT column_name
+                        FROM information_schema.columns
+                        WHERE table_name = 'consultations'
+                        AND table_schema = current_schema()
+                        AND column_name IN ({', '.join(f"'{column}'" for column in CONSULTATION_COLUMNS)})
+                        """
+    found = set(pd.read_sql_query(columns_query, conn)['column_name'])
+    lookup_exists = pd.read_sql_query("SELECT to_regclass('consultation_categories') IS NOT NULL AS found", conn)['found'][0]
+    missing = [column for column in CONSULTATION_COLUMNS if column not in found]
+    if not lookup_exists:
+        missing.insert(0, "consultation_categories table")
+    if missing:
+        raise RuntimeError(f"Database is missing {', '.join(missing)}. Apply {CONSULTATION_SCHEMA_FILE} to DATABASE_URL before starting the dashboard.")
+    names = set(pd.read_sql_query("SELECT DISTINCT category_name FROM consultation_categories", conn)['category_name'])
+    missing = [name for name in REPORT_CATEGORIES if name not in names]
+    if missing:
+        raise RuntimeError(f"consultation_categories has no rows for {', '.join(missing)}. Re-apply {CONSULTATION_SCHEMA_FILE}.")
+
+def category_codes(*names):
+    # Resolved inside each query so recoding a type in the lookup table applies straight away
+    quoted_names = ", ".join(f"'{name}'" for name in names)
+    return f"(SELECT category_code FROM consultation_categories WHERE category_name IN ({quoted_names}))"
+
 @st.cache_data(ttl=3600)
 def load_case_data(caseno: int):
     conn = connect_to_db()
+    check_report_schema()
     case_query = f"""SELECT
                 -- Cases table columns
                 c.caseno,
@@ -73,7 +142,7 @@ def load_case_data(caseno: int):
                 s.satisfaction,
                 s.comments as survey_comments,
                 -- Calculate consultation duration in minutes
-                ROUND(EXTRACT(EPOCH FROM (cons."Cons_End_Time" - cons."Cons_Begin_Time"))/60::numeric, 2) as consultation_duration_mins
+                ROUND(cons.cons_duration_secs/60::numeric, 2) as consultation_duration_mins
                 FROM cases c
                 LEFT JOIN consultations cons ON c.caseno = cons."Caseno"
                 LEFT JOIN users u ON cons."Cons_Clinicians_Name" = u.adastra
@@ -84,14 +153,15 @@ def load_case_data(caseno: int):
     case_df = pd.read_sql_query(case_query, conn)
     return case_df
 
-@st.cache_data(ttl=3600)
-def load_all_clinicans_data(selected_month_year:str):
-    conn = connect_to_db()
+def month_start(selected_month_year:str):
     if selected_month_year != '(All)':
-        formatted_date = datetime.strptime(selected_month_year, "%B %Y").strftime("%Y-%m-01")
-    else:
-        formatted_date = '2024-10-01'
-    all_clinicians_query = f"""WITH shift_hours AS (
+        return datetime.strptime(selected_month_year, "%B %Y").strftime("%Y-%m-01")
+    return '2024-10-01'
+
+def all_clinicians_query(selected_month_year:str):
+    formatted_date = month_start(selected_month_year)
+    check_report_schema()
+    return f"""WITH shift_hours AS (
                         -- This CTE is correct, keep as is
                         SELECT
                             u.fullname AS clinician_name,
@@ -111,7 +181,7 @@ def load_all_clinicans_data(selected_month_year:str):
                         SELECT
                             u.fullname AS clinician_name,
                             COUNT(DISTINCT c."Caseno") as total_consultations,
-                            ROUND(SUM(EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/3600)::numeric, 2) as total_consultation_hours,
+                            ROUND(SUM(c.cons_duration_secs/3600)::numeric, 2) as total_consultation_hours,
                             -- Fixed cost calculation using correlated subquery
                             ROUND((
                                 SELECT total_cost
@@ -119,33 +189,33 @@ def load_all_clinicans_data(selected_month_year:str):
                                 WHERE sh.clinician_name = u.fullname
                             ) / NULLIF(COUNT(DISTINCT c."Caseno"), 0)::numeric, 2) as avg_consultation_cost,
                             -- Rest of the counts remain the same
-                            COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('GP Advice', 'Advice') THEN c."Caseno" END) as gp_advice_count,
-                            COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('Treatment Centre','CAS Treatment Centre - BARDOC') THEN c."Caseno" END) as treatment_centre_count,
-                            COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('Visit','HMR VH Visit') THEN c."Caseno" END) as visit_count,
+                            COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Advice')} THEN c."Caseno" END) as gp_advice_count,
+                            COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Treatment Centre')} THEN c."Caseno" END) as treatment_centre_count,
+                            COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Visit')} THEN c."Caseno" END) as visit_count,
                             COUNT(DISTINCT CASE
-                                WHEN (c."Cons_Type" IN ('GP Advice', 'Advice') AND c."Next_Cons_Type" IN ('GP Advice', 'Advice'))
+                                WHEN (c.category_code IN {category_codes('Advice')} AND c.next_category_code IN {category_codes('Advice')})
                                 THEN c."Caseno"
                             END) as same_advice_type_count,
                             COUNT(DISTINCT CASE
-                                WHEN c."Cons_Type" IN ('GP Advice', 'Advice')
+                                WHEN c.category_code IN {category_codes('Advice')}
                                 THEN c."Caseno"
                             END) as total_advice_count,
                             ROUND(AVG(
                                 CASE
-                                    WHEN c."Cons_Type" IN ('GP Advice', 'Advice','NWAS Triage')
-                                    THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                    WHEN c.category_code IN {category_codes('Advice', 'NWAS Triage')}
+                                    THEN c.cons_duration_secs/60
                                 END
                             )::numeric, 2) as avg_gp_advice_duration,
                             ROUND(AVG(
                                 CASE
-                                    WHEN c."Cons_Type" IN ('Treatment Centre','CAS Treatment Centre - BARDOC')
-                                    THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                    WHEN c.category_code IN {category_codes('Treatment Centre')}
+                                    THEN c.cons_duration_secs/60
                                 END
                             )::numeric, 2) as avg_treatment_centre_duration,
                             ROUND(AVG(
                                 CASE
-                                    WHEN c."Cons_Type" IN ('Visit','HMR VH Visit')
-                                    THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                    WHEN c.category_code IN {category_codes('Visit')}
+                                    THEN c.cons_duration_secs/60
                                 END
                             )::numeric, 2) as avg_visit_duration
                         FROM rotas r
@@ -154,7 +224,7 @@ def load_all_clinicans_data(selected_month_year:str):
                         WHERE DATE_TRUNC('month', r.truelogin) = '{formatted_date}'::date
                         AND r.truelogin IS NOT NULL
                         AND r.truelogout IS NOT NULL
-                        AND c."Cons_Type" IN ('GP Advice', 'Advice', 'NWAS Triage','Treatment Centre','CAS Treatment Centre - BARDOC', 'Visit', 'HMR VH Visit' )
+                        AND c.category_code IS NOT NULL
                         GROUP BY u.fullname
                         HAVING u.fullname IS NOT NULL
                         )
@@ -180,12 +250,19 @@ def load_all_clinicans_data(selected_month_year:str):
                         INNER JOIN consultation_stats cs ON sh.clinician_name = cs.clinician_name
                         ORDER BY sh.total_shifts DESC, sh.clinician_name;
                         """
-    all_clinicians_df = pd.read_sql_query(all_clinicians_query, conn)
+
+@st.cache_data(ttl=3600)
+def load_all_clinicans_data(selected_month_year:str):
+    conn = connect_to_db()
+    all_clinicians_df = pd.read_sql_query(all_clinicians_query(selected_month_year), conn)
+    all_clinicians_df = compact_frame(all_clinicians_df, "load_all_clinicans_data",
+                                      strings=["clinician_name"])
     return all_clinicians_df
 
 @st.cache_data(ttl=3600)
 def load_shift_data(rslid: int):
     conn = connect_to_db()
+    check_report_schema()
     shift_query = f"""SELECT
                     r.personid,
                     r.rslid,
@@ -197,60 +274,58 @@ def load_shift_data(rslid: int):
                     c."Cons_Begin_Time" as consultation_start,
                     c."Cons_End_Time" as consultation_end,
                     -- Calculate consultation duration in minutes
-                    ROUND(EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60::numeric, 2) as consultation_duration_mins
+                    ROUND(c.cons_duration_secs/60::numeric, 2) as consultation_duration_mins
                     FROM rotas r
                     LEFT JOIN consultations c ON r.rslid = c.rslid
                     WHERE r.rslid = {rslid}  -- Parameter to be passed
                     ORDER BY c."Cons_Begin_Time";
                     """
     shift_df = pd.read_sql_query(shift_query, conn)
+    shift_df = compact_frame(shift_df, "load_shift_data",
+                             categories=["consultation_type", "next_consultation_type"])
     return shift_df
 
-@st.cache_data(ttl=3600)
-def load_clinician_data(personid: int, selected_month_year:str):
-    conn = connect_to_db()
-    if selected_month_year != '(All)':
-        formatted_date = datetime.strptime(selected_month_year, "%B %Y").strftime("%Y-%m-01")
-    else:
-        formatted_date = '2024-10-01'
-    clinician_query = f"""WITH shift_consultation_stats AS (
+def clinician_shifts_query(selected_month_year:str):
+    formatted_date = month_start(selected_month_year)
+    check_report_schema()
+    return f"""WITH shift_consultation_stats AS (
                             -- Calculate consultation statistics per shift
                             SELECT
                                 r.rslid,
                                 COUNT(DISTINCT c."Caseno") as shift_consultations,
                                 -- Consultation time for this shift
-                                ROUND(SUM(EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/3600)::numeric, 2) as shift_consultation_hours,
+                                ROUND(SUM(c.cons_duration_secs/3600)::numeric, 2) as shift_consultation_hours,
                                 -- Count by type for this shift
-                                COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('GP Advice', 'Advice') THEN c."Caseno" END) as shift_gp_advice_count,
-                                COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('Treatment Centre','CAS Treatment Centre - BARDOC') THEN c."Caseno" END) as shift_treatment_centre_count,
-                                COUNT(DISTINCT CASE WHEN c."Cons_Type" IN ('Visit','HMR VH Visit') THEN c."Caseno" END) as shift_visit_count,
+                                COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Advice')} THEN c."Caseno" END) as shift_gp_advice_count,
+                                COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Treatment Centre')} THEN c."Caseno" END) as shift_treatment_centre_count,
+                                COUNT(DISTINCT CASE WHEN c.category_code IN {category_codes('Visit')} THEN c."Caseno" END) as shift_visit_count,
                                 -- New: Count advice consultations that remain as advice
                                 COUNT(DISTINCT CASE
-                                    WHEN (c."Cons_Type" IN ('GP Advice', 'Advice') AND c."Next_Cons_Type" IN ('GP Advice', 'Advice'))
+                                    WHEN (c.category_code IN {category_codes('Advice')} AND c.next_category_code IN {category_codes('Advice')})
                                     THEN c."Caseno"
                                 END) as same_advice_type_count,
                                 -- New: Total advice consultations
                                 COUNT(DISTINCT CASE
-                                    WHEN c."Cons_Type" IN ('GP Advice', 'Advice')
+                                    WHEN c.category_code IN {category_codes('Advice')}
                                     THEN c."Caseno"
                                 END) as total_advice_count,
                                 -- Average duration by type for this shift (in minutes)
                                 ROUND(AVG(
                                     CASE
-                                        WHEN c."Cons_Type" IN ('GP Advice', 'Advice','NWAS Triage')
-                                        THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                        WHEN c.category_code IN {category_codes('Advice', 'NWAS Triage')}
+                                        THEN c.cons_duration_secs/60
                                     END
                                 )::numeric, 2) as shift_avg_gp_advice_duration,
                                 ROUND(AVG(
                                     CASE
-                                        WHEN c."Cons_Type" IN ('Treatment Centre','CAS Treatment Centre - BARDOC')
-                                        THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                        WHEN c.category_code IN {category_codes('Treatment Centre')}
+                                        THEN c.cons_duration_secs/60
                                     END
                                 )::numeric, 2) as shift_avg_treatment_centre_duration,
                                 ROUND(AVG(
                                     CASE
-                                        WHEN c."Cons_Type" IN ('Visit','HMR VH Visit')
-                                        THEN EXTRACT(EPOCH FROM (c."Cons_End_Time" - c."Cons_Begin_Time"))/60
+                                        WHEN c.category_code IN {category_codes('Visit')}
+                                        THEN c.cons_duration_secs/60
                                     END
                                 )::numeric, 2) as shift_avg_visit_duration
                             FROM rotas r
@@ -258,8 +333,7 @@ def load_clinician_data(personid: int, selected_month_year:str):
                             WHERE DATE_TRUNC('month', r.truelogin) = '{formatted_date}'::date
                             AND r.truelogin IS NOT NULL
                             AND r.truelogout IS NOT NULL
-                            AND c."Cons_Type" IN ('GP Advice', 'Advice', 'NWAS Triage','Treatment Centre','CAS Treatment Centre - BARDOC', 'Visit', 'HMR VH Visit')
-                            AND r.personid = {personid}
+                            AND c.category_code IS NOT NULL
                             GROUP BY r.rslid
                             )
                             SELECT
@@ -288,24 +362,53 @@ def load_clinician_data(personid: int, selected_month_year:str):
                             -- Additional shift details
                             r.role as shift_role,
                             r.dutystation as location,
-                            r.status as shift_status
+                            r.status as shift_status,
+                            r.personid as rota_personid
                             FROM rotas r
                             LEFT JOIN users u ON r.personid = u.personid
                             LEFT JOIN shift_consultation_stats cs ON r.rslid = cs.rslid
                             WHERE DATE_TRUNC('month', r.truelogin) = '{formatted_date}'::date
                             AND r.truelogin IS NOT NULL
                             AND r.truelogout IS NOT NULL
-                            AND r.personid = {personid}
                             AND EXISTS (
                             SELECT 1
                             FROM consultations c
                             WHERE c.rslid = r.rslid
-                            AND c."Cons_Type" IN ('GP Advice', 'Advice', 'NWAS Triage','Treatment Centre','CAS Treatment Centre - BARDOC', 'Visit', 'HMR VH Visit')
+                            AND c.category_code IS NOT NULL
                             )
-                            ORDER BY r.date, r.truelogin;
+                            ORDER BY r.personid, r.date, r.truelogin;
                         """
-    clinician_df = pd.read_sql_query(clinician_query, conn)
-    return clinician_df
+
+def month_consultations_query(selected_month_year:str):
+    formatted_date = month_start(selected_month_year)
+    return f"""SELECT *
+                FROM consultations
+                WHERE "Cons_Begin_Time" >= '{formatted_date}'::date
+                AND "Cons_Begin_Time" < '{formatted_date}'::date + interval '1 month'
+                ORDER BY "Cons_Begin_Time";
+                """
+
+@st.cache_resource(ttl=3600)
+def load_all_clinicians_shift_data(selected_month_year:str):
+    # Per-shift statistics for every clinician in the month, computed in one
+    # grouped scan and indexed by personid so switching clinicians is a lookup.
+    conn = connect_to_db()
+    shifts_df = pd.read_sql_query(clinician_shifts_query(selected_month_year), conn)
+    shifts_df = compact_frame(shifts_df, "load_all_clinicians_shift_data",
+                              categories=["shift_role", "location", "shift_status"],
+                              strings=["clinician_name"])
+    shifts_by_person = {
+        int(personid): drop_unused_categories(person_df.drop(columns="rota_personid").reset_index(drop=True))
+        for personid, person_df in shifts_df.groupby('rota_personid', sort=False)
+    }
+    empty_df = drop_unused_categories(shifts_df.drop(columns="rota_personid").iloc[0:0].copy())
+    return empty_df, shifts_by_person
+
+def load_clinician_data(personid: int, selected_month_year:str):
+    empty_df, shifts_by_person = load_all_clinicians_shift_data(selected_month_year)
+    # Callers add columns to the result, so never hand out the cached frame
+    clinician_df = shifts_by_person.get(int(personid), empty_df)
+    return clinician_df.copy()
 
 @st.cache_data(ttl=3600)
 def load_data():
@@ -323,6 +426,10 @@ def load_data():
     user_df = pd.read_sql_query(consultants_query, conn)
 
     merged_df = pd.merge(rotas_df, user_df, on="personid")
+    # duration and value are rewritten in place by the Activity Report, so they stay as objects
+    merged_df = compact_frame(merged_df, "load_data",
+                              categories=["role", "dutystation", "status"],
+                              strings=["adastra", "fullname"])
 
     return merged_df
 
@@ -345,6 +452,7 @@ def load_call_data():
                 call_hour;
             """
     phone_df = pd.read_sql_query(query, conn)
+    phone_df = compact_frame(phone_df, "load_call_data")
 
     return phone_df
 